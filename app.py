@@ -1,10 +1,103 @@
 import streamlit as st
+import asyncio
+import os
+import re
+import tempfile
+import time
+from itertools import chain, islice
+from pathlib import Path
+import httpx
+import orjson
 import requests
+import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup
-from fuzzywuzzy import process
-import re
-import matplotlib.pyplot as plt
+import lxml.html
+from lxml import etree
+from rapidfuzz import fuzz, process, utils
+
+CACHE_DIR = Path("~/.cache/dynasty_dash").expanduser()
+PLAYER_MAP_TTL = 24 * 60 * 60  # seconds
+KTC_TTL = 12 * 60 * 60  # seconds
+HTTP_TIMEOUT = 30  # seconds, per request
+AGE_RE = re.compile(r"(\d+(?:\.\d+)?)")
+
+@st.cache_resource
+def get_session():
+    """
+    One requests.Session per process, shared across Streamlit reruns,
+    so synchronous Sleeper calls reuse keep-alive connections.
+    """
+    return requests.Session()
+
+def _has_class(name):
+    """
+    XPath predicate matching elements whose class list contains `name`.
+    """
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+# Compiled once and reused for every KTC page
+PLAYER_XPATH = etree.XPath(f"//div[{_has_class('onePlayer')}]")
+NAME_XPATH = etree.XPath(f".//div[{_has_class('player-name')}]")
+LINK_XPATH = etree.XPath(".//a")
+TEAM_XPATH = etree.XPath(f".//span[{_has_class('player-team')}]")
+POSITION_TEAM_XPATH = etree.XPath(f".//div[{_has_class('position-team')}]")
+POSITION_XPATH = etree.XPath(f".//p[{_has_class('position')}]")
+AGE_XPATH = etree.XPath(".//p[@class='position hidden-xs']")
+VALUE_XPATH = etree.XPath(f".//div[{_has_class('value')}]")
+PARAGRAPH_XPATH = etree.XPath(".//p")
+
+def _first(xpath, element):
+    """
+    Return the first element matched by `xpath` under `element`, or None.
+    """
+    matches = xpath(element)
+    return matches[0] if matches else None
+
+def _is_fresh(path, ttl):
+    """
+    True if `path` exists and was modified within the last `ttl` seconds.
+    """
+    return path.exists() and path.stat().st_mtime > time.time() - ttl
+
+def _write_atomic(path, write):
+    """
+    Call `write` with a temporary path next to `path`, then move the result into place.
+    Readers never see a partially written file, even if the worker dies mid-write.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    os.close(fd)
+    tmp = Path(tmp_name)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+def _async_client(headers=None):
+    """
+    HTTP/2 client that follows redirects like requests does,
+    with an explicit per-request timeout instead of httpx's 5s default.
+    """
+    return httpx.AsyncClient(
+        headers=headers, http2=True, follow_redirects=True, timeout=HTTP_TIMEOUT
+    )
+
+async def _fetch_all(urls, headers=None):
+    """
+    Fetch several URLs concurrently over one HTTP/2 client.
+    Returns the responses in the same order as `urls`.
+    """
+    async with _async_client(headers) as client:
+        # Let every request finish before the client closes, then surface the first error
+        results = await asyncio.gather(
+            *(client.get(url) for url in urls), return_exceptions=True
+        )
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    return results
 
 @st.cache_data(show_spinner=False)
 def get_sleeper_player_map():
@@ -12,30 +105,43 @@ def get_sleeper_player_map():
     Fetch the (huge) dictionary of all NFL players from Sleeper,
     keyed by player_id.
     As recommended by Sleeper, do not call this repeatedly.
+    Also kept on disk for a day so new workers skip the download.
     """
-    url = "https://api.sleeper.app/v1/players/nfl"
-    resp = requests.get(url)
-    resp.raise_for_status()
-    data = resp.json()
-    
-    player_map = {}
-    for pid, pdata in data.items():
-        first = pdata.get("first_name", "").strip()
-        last = pdata.get("last_name", "").strip()
-        full_name = f"{first} {last}".strip()
-        if not full_name or full_name == "None None":
-            full_name = pid
-        player_map[pid] = full_name
-    return player_map
+    path = CACHE_DIR / "players.json"
+    data = None
+    if _is_fresh(path, PLAYER_MAP_TTL):
+        try:
+            data = orjson.loads(path.read_bytes())
+        except (OSError, orjson.JSONDecodeError):
+            data = None  # unreadable cache file, refetch below
+
+    if data is None:
+        url = "https://api.sleeper.app/v1/players/nfl"
+        resp = get_session().get(url, timeout=HTTP_TIMEOUT)
+        resp.raise_for_status()
+        data = orjson.loads(resp.content)
+        try:
+            _write_atomic(path, lambda tmp: tmp.write_bytes(resp.content))
+        except OSError:
+            pass  # the disk cache is only an optimization
+
+    # Fall back to the player_id when both name fields are missing or empty
+    return {
+        pid: (
+            f"{(pdata.get('first_name') or '').strip()} "
+            f"{(pdata.get('last_name') or '').strip()}"
+        ).strip() or pid
+        for pid, pdata in data.items()
+    }
 
 def get_sleeper_user_id(username: str):
     """
     Convert a Sleeper username to user_id.
     """
     url = f"https://api.sleeper.app/v1/user/{username}"
-    resp = requests.get(url)
+    resp = get_session().get(url, timeout=HTTP_TIMEOUT)
     resp.raise_for_status()
-    return resp.json()["user_id"]
+    return orjson.loads(resp.content)["user_id"]
 
 def get_sleeper_league_data(league_id: str):
     """
@@ -44,13 +150,13 @@ def get_sleeper_league_data(league_id: str):
     users_url = f"https://api.sleeper.app/v1/league/{league_id}/users"
     rosters_url = f"https://api.sleeper.app/v1/league/{league_id}/rosters"
 
-    u_resp = requests.get(users_url)
-    r_resp = requests.get(rosters_url)
+    # Users and rosters are independent, so fetch them together
+    u_resp, r_resp = asyncio.run(_fetch_all([users_url, rosters_url]))
     u_resp.raise_for_status()
     r_resp.raise_for_status()
 
-    users_data = u_resp.json()
-    rosters_data = r_resp.json()
+    users_data = orjson.loads(u_resp.content)
+    rosters_data = orjson.loads(r_resp.content)
     return users_data, rosters_data
 
 def parse_rosters_into_dataframe(users_data, rosters_data, player_map):
@@ -60,35 +166,122 @@ def parse_rosters_into_dataframe(users_data, rosters_data, player_map):
     """
     user_map = {u["user_id"]: u.get("display_name", f"User {u['user_id']}") for u in users_data}
 
+    slots = {"Players": "players", "Taxi Squad": "taxi", "Reserve": "reserve"}
+
+    # Flatten every roster slot into one id list so names are resolved in one pass.
+    # Sleeper ids are already strings in the JSON, so they index player_map directly.
+    flat_pids = []
+    for roster in rosters_data:
+        for key in slots.values():
+            flat_pids.extend(roster.get(key) or [])
+    names = iter([player_map.get(pid, f"Unknown ({pid})") for pid in flat_pids])
+
     rows = []
     for roster in rosters_data:
         owner_id = roster.get("owner_id", "")
-        owner_name = user_map.get(owner_id, f"User {owner_id}")
-
-        players = roster.get("players") or []
-        taxi = roster.get("taxi") or []
-        reserve = roster.get("reserve") or []
-
-        def id_to_name(pid):
-            return player_map.get(str(pid), f"Unknown ({pid})")
-
-        rows.append({
-            "Owner": owner_name,
+        row = {
+            "Owner": user_map.get(owner_id, f"User {owner_id}"),
             "Roster ID": roster["roster_id"],
-            "Players": [id_to_name(pid) for pid in players],
-            "Taxi Squad": [id_to_name(pid) for pid in taxi],
-            "Reserve": [id_to_name(pid) for pid in reserve]
-        })
+        }
+        for column, key in slots.items():
+            row[column] = list(islice(names, len(roster.get(key) or [])))
+        rows.append(row)
 
     return pd.DataFrame(rows)
 
-@st.cache_data(show_spinner=False)
+def _parse_ktc_page(text):
+    """
+    Parse one KTC rankings page from its decoded text, so the charset
+    from the HTTP headers is honored.
+    Returns (players, ranks, n_divs): the player dicts, the set of non-empty ranks,
+    and how many player rows the page had.
+    """
+    if not text.strip():
+        return [], set(), 0
+
+    tree = lxml.html.fromstring(text)
+    player_divs = PLAYER_XPATH(tree)
+    ranks = {div.get("data-attr", "").strip() for div in player_divs} - {""}
+
+    players = []
+    for player_div in player_divs:
+        try:
+            rank = player_div.get("data-attr", "").strip()
+
+            name_tag = _first(NAME_XPATH, player_div)
+            name = (
+                _first(LINK_XPATH, name_tag).text_content().strip()
+                if name_tag is not None else "Unknown"
+            )
+
+            team_span = _first(TEAM_XPATH, name_tag) if name_tag is not None else None
+            team = team_span.text_content().strip() if team_span is not None else "N/A"
+
+            position_div = _first(POSITION_TEAM_XPATH, player_div)
+            position = (
+                _first(POSITION_XPATH, position_div).text_content().strip()
+                if position_div is not None else "Unknown"
+            )
+
+            # Age is under <p class='position hidden-xs'> with 'y.o.'
+            age_span = _first(AGE_XPATH, position_div) if position_div is not None else None
+            age = age_span.text_content().strip() if age_span is not None else "N/A"
+
+            value_div = _first(VALUE_XPATH, player_div)
+            value = (
+                _first(PARAGRAPH_XPATH, value_div).text_content().strip()
+                if value_div is not None else "0"
+            )
+
+            players.append({
+                "Rank": rank,
+                "Name": name,
+                "Team": team,
+                "Position": position,
+                "Age": age,
+                "KTC_Value": value,
+            })
+        except:
+            continue
+
+    return players, ranks, len(player_divs)
+
+async def _fetch_and_parse_ktc(urls, headers):
+    """
+    Fetch KTC pages concurrently, parsing each in a worker thread as soon as it arrives.
+    Returns one entry per URL, in order: the parsed page, or the exception raised
+    while fetching or parsing it. Errors are returned rather than raised so a bad
+    page past the end of the rankings doesn't abort pages that are still needed.
+    """
+    async with _async_client(headers) as client:
+        async def fetch_and_parse(url):
+            try:
+                resp = await client.get(url)
+                resp.raise_for_status()
+                return await asyncio.to_thread(_parse_ktc_page, resp.text)
+            except Exception as exc:
+                return exc
+
+        return await asyncio.gather(*(fetch_and_parse(url) for url in urls))
+
+@st.cache_data(show_spinner=False, ttl=KTC_TTL)
 def get_all_ktc_players_paginated(max_pages=10):
     """
     Scrapes all KTC dynasty rankings pages up to `max_pages`.
     Each page has ~50 players, so page=0 => first 50, page=1 => next 50, etc.
     Returns a DataFrame of all players found.
+    Results are kept on disk for 12 hours so new workers skip the scrape.
+    The in-memory cache also expires after 12 hours, but it may have been filled
+    from a disk file that was already up to 12 hours old, so data can be ~24h stale.
     """
+    # Versioned so files written before the numeric columns existed are ignored
+    path = CACHE_DIR / f"ktc_v2_{max_pages}.parquet"
+    if _is_fresh(path, KTC_TTL):
+        try:
+            return pd.read_parquet(path)
+        except (OSError, ValueError):
+            pass  # unreadable cache file, scrape again below
+
     base_url = "https://keeptradecut.com/dynasty-rankings"
     headers = {
         "User-Agent": (
@@ -98,77 +291,124 @@ def get_all_ktc_players_paginated(max_pages=10):
         )
     }
 
-    all_players = []
-    for page_num in range(max_pages):
-        url = f"{base_url}?page={page_num}&filters=QB|WR|RB|TE|RDP&format=1"
-        resp = requests.get(url, headers=headers)
-        resp.raise_for_status()
+    urls = [
+        f"{base_url}?page={page_num}&filters=QB|WR|RB|TE|RDP&format=1"
+        for page_num in range(max_pages)
+    ]
+    # Network and parsing overlap across pages; results are walked in page order
+    pages = asyncio.run(_fetch_and_parse_ktc(urls, headers))
 
-        soup = BeautifulSoup(resp.text, "html.parser")
-        player_divs = soup.find_all("div", class_="onePlayer")
+    all_players = []
+    seen_ranks = set()
+    for page in pages:
+        if isinstance(page, Exception):
+            raise page
+        players, page_ranks, n_divs = page
 
-        if not player_divs:
+        if not n_divs:
             break  # no more players
 
-        for player_div in player_divs:
-            try:
-                rank = player_div.get("data-attr", "").strip()
-
-                name_tag = player_div.find("div", class_="player-name")
-                name = name_tag.find("a").text.strip() if name_tag else "Unknown"
+        # Past the last page KTC can repeat players we've already seen
+        if page_ranks & seen_ranks:
+            break
+        seen_ranks |= page_ranks
 
-                team_span = name_tag.find("span", class_="player-team") if name_tag else None
-                team = team_span.text.strip() if team_span else "N/A"
+        all_players.extend(players)
 
-                position_div = player_div.find("div", class_="position-team")
-                position = (
-                    position_div.find("p", class_="position").text.strip()
-                    if position_div else "Unknown"
-                )
+        if n_divs < 50:
+            break
 
-                # Age is under <p class='position hidden-xs'> with 'y.o.'
-                age_span = position_div.find("p", class_="position hidden-xs") if position_div else None
-                age = age_span.text.strip() if age_span else "N/A"
+    ktc_df = pd.DataFrame(all_players)
+    if ktc_df.empty:
+        return ktc_df
 
-                value_div = player_div.find("div", class_="value")
-                value = value_div.find("p").text.strip() if value_div else "0"
+    # Parse the numeric fields once here so downstream code never re-parses strings
+    ktc_df["Rank"] = pd.to_numeric(ktc_df["Rank"], errors="coerce")
+    ktc_df["KTC_Value_Num"] = pd.to_numeric(
+        ktc_df["KTC_Value"].str.replace(",", "", regex=False), errors="coerce"
+    )
+    ktc_df["Age_Num"] = pd.to_numeric(
+        ktc_df["Age"].str.extract(AGE_RE, expand=False), errors="coerce"
+    )
 
-                all_players.append({
-                    "Rank": rank,
-                    "Name": name,
-                    "Team": team,
-                    "Position": position,
-                    "Age": age,
-                    "KTC_Value": value,
-                })
-            except:
-                continue
+    try:
+        _write_atomic(path, lambda tmp: ktc_df.to_parquet(tmp, index=False))
+    except OSError:
+        pass  # the disk cache is only an optimization
+    return ktc_df
 
-        if len(player_divs) < 50:
-            break
+NAME_SUFFIXES = {"jr", "sr", "ii", "iii", "iv", "v"}
 
-    return pd.DataFrame(all_players)
+def _last_name_initial(processed_name):
+    """
+    First letter of the last name in a processed name, ignoring suffixes like 'jr' or 'ii'.
+    """
+    tokens = processed_name.split()
+    while len(tokens) > 1 and tokens[-1] in NAME_SUFFIXES:
+        tokens.pop()
+    return tokens[-1][:1] if tokens else ""
 
-def parse_age(age_str: str) -> float:
+def _best_matches(queries, choices, score_cutoff):
+    """
+    Score processed `queries` against processed `choices` in one cdist call.
+    Returns, per query, the index of the best choice or -1 below `score_cutoff`.
     """
-    Convert a KTC age string like '25.7 y.o.' to a float (25.7).
-    Returns 0.0 if parsing fails or if input is not a valid string.
+    scores = process.cdist(
+        queries,
+        choices,
+        scorer=fuzz.WRatio,
+        score_cutoff=score_cutoff,
+        workers=-1,
+        dtype=np.uint8,
+    )
+    best_idx = scores.argmax(axis=1)
+    found = scores[np.arange(len(queries)), best_idx] > 0
+    return np.where(found, best_idx, -1)
+
+def fuzzy_match_indices(queries, choices, score_cutoff=81):
     """
-    if not isinstance(age_str, str):
-        return 0.0
-    match = re.search(r"(\d+(\.\d+)?)", age_str)
-    if match:
-        return float(match.group(1))
-    return 0.0
+    For each query, return the index of its best fuzzy match in `choices`,
+    or -1 if nothing scores at least `score_cutoff`.
+    Names are first compared only within the same last-name initial, which skips
+    most obvious non-matches; queries that find nothing there are retried against all choices.
+    """
+    processed_choices = [utils.default_process(c) for c in choices]
+    processed_queries = [utils.default_process(q) for q in queries]
+
+    choice_blocks = {}
+    for idx, name in enumerate(processed_choices):
+        choice_blocks.setdefault(_last_name_initial(name), []).append(idx)
+    query_blocks = {}
+    for idx, name in enumerate(processed_queries):
+        query_blocks.setdefault(_last_name_initial(name), []).append(idx)
+
+    best = np.full(len(queries), -1)
+    for letter, q_idxs in query_blocks.items():
+        c_idxs = choice_blocks.get(letter)
+        if not c_idxs:
+            continue
+        local = _best_matches(
+            [processed_queries[i] for i in q_idxs],
+            [processed_choices[i] for i in c_idxs],
+            score_cutoff,
+        )
+        found = local >= 0
+        best[np.array(q_idxs)[found]] = np.array(c_idxs)[local[found]]
+
+    # Unblocked fallback for anything the blocked pass missed
+    missed = np.flatnonzero(best < 0)
+    if len(missed) and processed_choices:
+        best[missed] = _best_matches(
+            [processed_queries[i] for i in missed], processed_choices, score_cutoff
+        )
+    return best
 
 def classify_team(team_value_df: pd.DataFrame) -> str:
     """
-    Given a DataFrame of a team's players (with KTC_Value and Age columns),
+    Given a DataFrame of a team's players (with Value_Numeric and Age_Numeric columns),
     determine if it's a Contender, Tweener, or Rebuild.
     """
     total_ktc = team_value_df["Value_Numeric"].sum()
-    if "Age_Numeric" not in team_value_df.columns:
-        team_value_df["Age_Numeric"] = team_value_df["Age"].apply(parse_age)
     avg_age = team_value_df["Age_Numeric"].mean()
 
     # Example thresholds (tweak these)
@@ -225,7 +465,7 @@ if st.button("Fetch My Team's Data"):
 
         with tab2:
             st.write("### KeepTradeCut Rankings")
-            st.dataframe(ktc_df)
+            st.dataframe(ktc_df.drop(columns=["KTC_Value_Num", "Age_Num"], errors="ignore"))
 
         with tab3:
             # If the user has no roster, show a warning
@@ -239,65 +479,60 @@ if st.button("Fetch My Team's Data"):
                 st.dataframe(my_roster[["Players", "Taxi Squad", "Reserve"]])
 
                 # Summarize your main players with KTC
-                roster_players = []
-                for row_index, row_data in my_roster.iterrows():
-                    roster_players.extend(row_data["Players"])
+                roster_players = list(chain.from_iterable(my_roster["Players"].tolist()))
 
                 def normalize_name(name):
                     parts = name.strip().lower().split()
                     first, last = parts[0], parts[-1] if len(parts) > 1 else ""
                     return first, last
 
-                ktc_name_map = {
-                    normalize_name(row["Name"]): row
-                    for _, row in ktc_df.iterrows()
-                }
-
-                your_team_value_data = []
-                for p_name in roster_players:
-                    p_first, p_last = normalize_name(p_name)
-                    # exact match or fallback fuzzy
-                    if (p_first, p_last) in ktc_name_map:
-                        best_match = ktc_name_map[(p_first, p_last)]
-                    else:
-                        best_match_name, score = process.extractOne(
-                            p_name, ktc_df["Name"].tolist()
-                        )
-                        best_match = (
-                            ktc_df[ktc_df["Name"] == best_match_name].iloc[0]
-                            if score and score > 80
-                            else None
-                        )
-
-                    if best_match is not None:
-                        your_team_value_data.append({
-                            "Player": p_name,
-                            "KTC_Name": best_match["Name"],
-                            "Position": best_match["Position"],
-                            "KTC_Value": best_match["KTC_Value"],
-                            "Age": best_match["Age"],
-                        })
-                    else:
-                        your_team_value_data.append({
-                            "Player": p_name,
-                            "KTC_Name": "No Match",
-                            "Position": None,
-                            "KTC_Value": None,
-                            "Age": None,
-                        })
-
-                team_value_df = pd.DataFrame(your_team_value_data)
-
-                # Convert KTC_Value to float
-                def safe_float(v):
-                    try:
-                        return float(v.replace(",", ""))
-                    except:
-                        return 0.0
-
-                team_value_df["Value_Numeric"] = team_value_df["KTC_Value"].apply(safe_float)
+                ktc_cols = ["Name", "Position", "KTC_Value", "Age", "KTC_Value_Num", "Age_Num"]
+                ktc_names = ktc_df["Name"].tolist()
+
+                roster_df = pd.DataFrame({"Player": roster_players})
+                roster_df[["first", "last"]] = pd.DataFrame(
+                    [normalize_name(p) for p in roster_players],
+                    columns=["first", "last"],
+                )
+
+                ktc_keyed = ktc_df[ktc_cols].copy()
+                ktc_keyed[["k_first", "k_last"]] = pd.DataFrame(
+                    [normalize_name(n) for n in ktc_names],
+                    columns=["k_first", "k_last"],
+                    index=ktc_keyed.index,
+                )
+                ktc_keyed = ktc_keyed.drop_duplicates(["k_first", "k_last"], keep="last")
+
+                # Exact first/last matches in one join
+                merged = roster_df.merge(
+                    ktc_keyed,
+                    left_on=["first", "last"],
+                    right_on=["k_first", "k_last"],
+                    how="left",
+                )
+
+                # Fuzzy fallback for whatever the join missed
+                unmatched = merged["Name"].isna()
+                if unmatched.any():
+                    best_idx = fuzzy_match_indices(
+                        merged.loc[unmatched, "Player"].tolist(), ktc_names
+                    )
+                    found = best_idx >= 0
+                    fallback = ktc_df[ktc_cols].iloc[best_idx[found]]
+                    fallback.index = merged.index[unmatched.to_numpy()][found]
+                    merged.loc[fallback.index, ktc_cols] = fallback
+
+                team_value_df = merged[["Player"] + ktc_cols].rename(columns={
+                    "Name": "KTC_Name",
+                    "KTC_Value_Num": "Value_Numeric",
+                    "Age_Num": "Age_Numeric",
+                })
+                team_value_df["KTC_Name"] = team_value_df["KTC_Name"].fillna("No Match")
+                # Unmatched players count as zero value and zero age
+                team_value_df["Value_Numeric"] = team_value_df["Value_Numeric"].fillna(0.0)
+                team_value_df["Age_Numeric"] = team_value_df["Age_Numeric"].fillna(0.0)
                 st.write("### Keep Trade Cut Values for Your Team")
-                st.dataframe(team_value_df)
+                st.dataframe(team_value_df.drop(columns=["Age_Numeric"]))
 
                 total_val = team_value_df["Value_Numeric"].sum()
                 st.write(f"**Your Team's Approximate Total Value**: {total_val}")
@@ -307,12 +542,11 @@ if st.button("Fetch My Team's Data"):
                 st.write(f"**Contention Status**: {label}")
 
                 # Show average age
-                team_value_df["Age_Numeric"] = team_value_df["Age"].apply(parse_age)
                 mean_age = team_value_df["Age_Numeric"].mean()
                 st.write(f"**Average Age**: {mean_age:.1f}")
 
                 # Quick bar chart of top ~12 players by KTC
-                top_12 = team_value_df.sort_values("Value_Numeric", ascending=False).head(12)
+                top_12 = team_value_df.nlargest(12, "Value_Numeric")
                 st.bar_chart(data=top_12, x="Player", y="Value_Numeric")
 
     except Exception as e: